@@ -3,37 +3,490 @@
 Servidor MCP para VS Code - Manipulación de archivos y terminal
 """
 
+import ast
 import asyncio
+import codecs
+import fnmatch
+import io
 import json
+import locale
 import logging
 import math
 import os
-import subprocess
+import re
 import shutil
+import signal
+import socket
+import stat
+import sys
 from datetime import datetime
-from pathlib import Path
-from typing import Dict, List, Any, Optional
+from functools import lru_cache, partial
+from typing import Dict, List, Any, Optional, Union
 
-# Configurar logging
+try:
+    import orjson
+except ImportError:  # orjson es opcional: se usa json de la stdlib
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # msgspec es opcional: sin él solo se ofrece JSON por líneas
+    msgspec = None
+
+try:
+    import uvloop
+except ImportError:  # uvloop es opcional (no existe en Windows)
+    uvloop = None
+
+try:
+    import scandir_rs
+except ImportError:  # scandir_rs es opcional: sin él search_files usa os.walk
+    scandir_rs = None
+
+# Configurar logging (nivel configurable con MCP_LOG_LEVEL)
+_log_level = (os.getenv("MCP_LOG_LEVEL") or "INFO").strip().upper()
+# getLevelName devuelve el número del nivel solo para nombres conocidos
+_log_level_valid = isinstance(logging.getLevelName(_log_level), int)
 logging.basicConfig(
-    level=logging.INFO,
+    level=_log_level if _log_level_valid else logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+if not _log_level_valid:
+    logger.warning("MCP_LOG_LEVEL inválido (%r); se usa INFO", _log_level)
 
 MCP_VERSION = "2024-11-05"
 
-class MCPServer:
-    """Servidor MCP para manipulación de archivos y terminal en VS Code"""
+# Codificación JSON del camino caliente (solicitudes y respuestas, en bytes)
+if orjson is not None:
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+else:
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+
+    _json_loads = json.loads
+
+# JSON indentado para los textos legibles de algunas herramientas
+if orjson is not None:
+    def _json_pretty(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+else:
+    def _json_pretty(obj: Any) -> str:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+
+# Límite de tamaño de un mensaje entrante
+READ_LIMIT = 1 << 20
+
+class JSONCodec:
+    """Transporte por defecto: JSON delimitado por saltos de línea
+    
+    El sobre JSON-RPC es fijo (solo varían el id y el result/error), así que
+    se arma concatenando fragmentos ya codificados.
+    """
+    
+    name = "json"
+    decode_errors = (json.JSONDecodeError,)  # orjson.JSONDecodeError hereda de esta
+    validation_errors = ()  # Solo el decodificador tipado de msgpack valida la estructura
+    prefix = b'{"jsonrpc":"2.0","id":'
+    result_member = b',"result":'
+    error_member = b',"error":'
+    suffix = b'}'
+    # {"content":[{"type":"text","text": ...}]} alrededor del texto codificado
+    text_prefix = b'{"content":[{"type":"text","text":'
+    text_suffix = b'}]}'
+    
+    dumps = staticmethod(_json_dumps)
+    loads = staticmethod(_json_loads)
+    
+    def parse_request(self, data: bytes):
+        """Decodifica una solicitud y devuelve (method, params, id)"""
+        request = self.loads(data)
+        return request.get("method", ""), request.get("params", {}), request.get("id")
+    
+    def text_result(self, text: str) -> bytes:
+        """Codifica el resultado de texto de una herramienta sin construir el dict"""
+        return b"".join((self.text_prefix, self.dumps(text), self.text_suffix))
+    
+    def envelope(self, request_id, member: bytes, payload: bytes) -> bytes:
+        """Arma el mensaje de respuesta a partir de su result/error codificado"""
+        return b"".join((self.prefix, self.dumps(request_id), member, payload, self.suffix))
+    
+    async def read_message(self, reader) -> Optional[bytes]:
+        """Lee el siguiente mensaje; None al cerrar la conexión"""
+        try:
+            data = await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            data = e.partial  # última línea sin salto de línea final
+        return data.strip() if data else None
+    
+    def frame(self, message: bytes) -> bytes:
+        return message + b'\n'
+
+if msgspec is not None:
+    class MsgpackRequest(msgspec.Struct):
+        """Solicitud JSON-RPC decodificada y validada directamente por msgspec"""
+        method: str = ""
+        # Mismos tipos que acepta el camino JSON (params posicionales, id decimal)
+        params: Union[Dict[str, Any], List[Any], None] = {}
+        id: Union[int, float, str, None] = None
+        jsonrpc: str = "2.0"
+
+class MsgpackCodec(JSONCodec):
+    """Transporte opcional: MessagePack con prefijo de longitud de 4 bytes
+    
+    Se negocia en initialize con capabilities.experimental.transport = "msgpack".
+    """
+    
+    name = "msgpack"
+    
+    def __init__(self):
+        self._encoder = msgspec.msgpack.Encoder()
+        self._decoder = msgspec.msgpack.Decoder()
+        self._request_decoder = msgspec.msgpack.Decoder(MsgpackRequest)
+        self.decode_errors = (msgspec.DecodeError,)
+        self.validation_errors = (msgspec.ValidationError,)  # Subclase de DecodeError
+        self.dumps = self._encoder.encode
+        self.loads = self._decoder.decode
+        # Un mapa de 3 entradas: jsonrpc, id y result/error
+        self.prefix = b"\x83" + self.dumps("jsonrpc") + self.dumps("2.0") + self.dumps("id")
+        self.result_member = self.dumps("result")
+        self.error_member = self.dumps("error")
+        self.suffix = b""
+        # Mapa {content: [{type: "text", text: ...}]}
+        self.text_prefix = (b"\x81" + self.dumps("content") + b"\x91" + b"\x82"
+                            + self.dumps("type") + self.dumps("text") + self.dumps("text"))
+        self.text_suffix = b""
+    
+    def parse_request(self, data: bytes):
+        request = self._request_decoder.decode(data)
+        return request.method, request.params, request.id
+    
+    def recover_id(self, data: bytes):
+        """id de una solicitud que no pasó la validación, si se puede leer"""
+        try:
+            request = self.loads(data)
+        except msgspec.DecodeError:
+            return None
+        request_id = request.get("id") if isinstance(request, dict) else None
+        return request_id if isinstance(request_id, (int, float, str)) else None
+    
+    async def read_message(self, reader) -> Optional[bytes]:
+        try:
+            header = await reader.readexactly(4)
+        except asyncio.IncompleteReadError:
+            return None
+        length = int.from_bytes(header, "big")
+        if length > READ_LIMIT:
+            raise ValueError(f"Mensaje demasiado grande: {length} bytes")
+        return await reader.readexactly(length)
+    
+    def frame(self, message: bytes) -> bytes:
+        return len(message).to_bytes(4, "big") + message
+
+JSON_CODEC = JSONCodec()
+MSGPACK_CODEC = MsgpackCodec() if msgspec is not None else None
+CODECS = tuple(codec for codec in (JSON_CODEC, MSGPACK_CODEC) if codec is not None)
+
+async def _to_thread(func, *args, **kwargs):
+    """Ejecuta una función bloqueante en el pool de hilos del event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(func, *args, **kwargs))
+
+READ_CHUNK_SIZE = 64 * 1024
+
+def _read_text_chunks(path: str, max_bytes: Optional[int] = None) -> tuple:
+    """Lee un archivo UTF-8 en bloques; devuelve (bloques de texto, truncado)"""
+    # Mismo resultado que open(..., 'r', encoding='utf-8') sin cargar el archivo en un único str
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder("utf-8")(), translate=True)
+    chunks = []
+    remaining = max_bytes
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            data = f.read(READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining))
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            text = decoder.decode(data)
+            if text:
+                chunks.append(text)
+        else:
+            # Límite alcanzado: se descartan los bytes de un carácter incompleto
+            if f.read(1):
+                return chunks, True
+    text = decoder.decode(b"", final=True)
+    if text:
+        chunks.append(text)
+    return chunks, False
+
+def _write_text_file(path: str, content: str, append: bool) -> None:
+    # Crear directorios padres si no existen
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a' if append else 'w', encoding='utf-8') as f:
+        f.write(content)
+
+_GLOB_CHARS = frozenset("*?[")
+
+def _walk_files(search_path: str):
+    """Recorre el árbol como os.walk y produce (directorio, archivos)"""
+    if scandir_rs is None or not os.path.isdir(search_path):
+        for root, dirs, files in os.walk(search_path):
+            yield root, files
+        return
+    # Recorrido nativo (Rust); se clasifica igual que os.walk: todo lo que no es
+    # un directorio, incluidos los enlaces simbólicos a archivos, cuenta como archivo
+    for rel, dirs, files, symlinks, other, errors in scandir_rs.Walk(search_path, return_type=scandir_rs.ReturnType.Ext):
+        root = os.path.join(search_path, rel) if rel else search_path
+        if symlinks:
+            files = files + [name for name in symlinks if not os.path.isdir(os.path.join(root, name))]
+        yield root, files + other if other else files
+
+def _find_files(search_path: str, pattern: str) -> List[str]:
+    # Se ejecuta fuera del event loop
+    if pattern in ("*", "*.*"):
+        matches = None
+    elif _GLOB_CHARS.isdisjoint(pattern):
+        # Sin comodines se mantiene la búsqueda por subcadena
+        matches = lambda name: pattern in name
+    else:
+        matches = re.compile(fnmatch.translate(pattern)).match
+    
+    found_files = []
+    for root, files in _walk_files(search_path):
+        for file in files:
+            if matches is None or matches(file):
+                found_files.append(os.path.join(root, file))
+    return found_files
+
+def _decode_output(data: bytes) -> str:
+    """Decodifica la salida de un proceso como texto (igual que text=True)"""
+    return data.decode(locale.getpreferredencoding(False), errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+async def _run_shell(command: str, cwd: str, timeout: Optional[float] = None):
+    """Ejecuta un comando de shell sin bloquear el event loop
+    
+    Devuelve (returncode, stdout, stderr). Si se supera el timeout se mata el
+    proceso (en POSIX, todo su grupo, para no dejar hijos de la shell con las
+    tuberías abiertas) y se propaga asyncio.TimeoutError.
+    """
+    process = await asyncio.create_subprocess_shell(
+        command,
+        cwd=cwd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=(os.name != 'nt')
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        try:
+            if os.name == 'nt':
+                process.kill()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        raise
+    return process.returncode, _decode_output(stdout), _decode_output(stderr)
+
+# Plantillas de los prompts: solo se sustituyen los argumentos del cliente
+_PROMPT_TEMPLATES = {
+    "code_review": (
+        "Revisa este código {language}:\n\n{code}\n\n"
+        "Proporciona comentarios sobre calidad, posibles errores y optimizaciones."
+    ),
+    "code_explanation": (
+        "Explica cómo funciona este código {language}:\n\n{code}\n\n"
+        "Describe el propósito, las funciones principales y cualquier detalle importante."
+    ),
+    "create_test": (
+        "Genera tests usando {framework} para este código {language}:\n\n{code}\n\n"
+        "Incluye casos de prueba para diferentes escenarios."
+    )
+}
+
+# Calculadora: solo aritmética y funciones/constantes públicas de math
+_CALC_NAMESPACE = {name: value for name, value in vars(math).items() if not name.startswith("_")}
+# Límites para que una expresión no bloquee el event loop (p. ej. 9**9**9 o
+# factorial(10000)*factorial(10000)*...): la longitud acota el número de
+# operaciones y CALC_MAX_INT_BITS el coste de cada una
+CALC_MAX_EXPRESSION = 10_000  # caracteres
+CALC_MAX_INT_BITS = 20_000    # tamaño de cualquier entero intermedio o final
+CALC_MAX_FACTORIAL = 2_000    # mayor n aceptado en factorial, perm y comb
+
+def _calc_check_bits(bits: int) -> None:
+    if bits > CALC_MAX_INT_BITS:
+        raise ValueError("Resultado demasiado grande")
+
+def _calc_pow(base, exponent):
+    """a**b con el tamaño del resultado entero acotado"""
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+        _calc_check_bits(base.bit_length() * exponent)
+    return base ** exponent
+
+def _calc_mul(left, right):
+    """a*b con el tamaño del resultado entero acotado"""
+    if isinstance(left, int) and isinstance(right, int):
+        _calc_check_bits(left.bit_length() + right.bit_length())
+    return left * right
+
+def _calc_limited(func):
+    """Envuelve una función de math rechazando un primer argumento excesivo"""
+    def limited(n, *args):
+        if isinstance(n, int) and n > CALC_MAX_FACTORIAL:
+            raise ValueError(f"{func.__name__}: argumento demasiado grande (máximo {CALC_MAX_FACTORIAL})")
+        return func(n, *args)
+    return limited
+
+def _calc_lcm(*args):
+    """lcm acotado: el resultado puede ser tan grande como el producto de los argumentos"""
+    _calc_check_bits(sum(arg.bit_length() for arg in args if isinstance(arg, int)))
+    return math.lcm(*args)
+
+for _name in ("factorial", "perm", "comb"):
+    if _name in _CALC_NAMESPACE:
+        _CALC_NAMESPACE[_name] = _calc_limited(_CALC_NAMESPACE[_name])
+if "lcm" in _CALC_NAMESPACE:
+    _CALC_NAMESPACE["lcm"] = _calc_lcm
+# Espacio de nombres del eval: añade las operaciones acotadas, que el usuario no puede nombrar
+_CALC_EVAL_NAMESPACE = {**_CALC_NAMESPACE, "_pow": _calc_pow, "_mul": _calc_mul}
+# Operadores que pueden hacer crecer un entero sin límite -> función acotada
+_CALC_GUARDED_OPS = {ast.Pow: "_pow", ast.Mult: "_mul"}
+
+class _GuardBinOps(ast.NodeTransformer):
+    """Reescribe a**b como _pow(a, b) y a*b como _mul(a, b)"""
+    
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        guard = _CALC_GUARDED_OPS.get(type(node.op))
+        if guard is not None:
+            call = ast.Call(func=ast.Name(id=guard, ctx=ast.Load()), args=[node.left, node.right], keywords=[])
+            return ast.copy_location(call, node)
+        return node
+
+_CALC_ALLOWED_NODES = (
+    ast.Expression, ast.Constant, ast.Name, ast.Load, ast.Call,
+    ast.BinOp, ast.UnaryOp,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub
+)
+
+@lru_cache(maxsize=4096)
+def _resolve_cached(workspace_root: str, path: str) -> str:
+    """Resuelve una ruta relativa respecto al workspace, cacheado por (raíz, ruta)"""
+    return os.path.normpath(os.path.join(workspace_root, path))
+
+@lru_cache(maxsize=1024)
+def _compile_expression(expression: str):
+    """Valida el AST de una expresión y la compila una única vez"""
+    if len(expression) > CALC_MAX_EXPRESSION:
+        raise ValueError(f"Expresión demasiado larga (máximo {CALC_MAX_EXPRESSION} caracteres)")
+    tree = ast.parse(expression, mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _CALC_ALLOWED_NODES):
+            raise ValueError(f"Operación no permitida: {type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id not in _CALC_NAMESPACE:
+            raise ValueError(f"Nombre no permitido: {node.id}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, complex)):
+            raise ValueError(f"Constante no permitida: {node.value!r}")
+        if isinstance(node, ast.Constant) and isinstance(node.value, int):
+            _calc_check_bits(node.value.bit_length())
+        if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.keywords):
+            raise ValueError("Solo se permiten llamadas a funciones de math con argumentos posicionales")
+    tree = ast.fix_missing_locations(_GuardBinOps().visit(tree))
+    return compile(tree, "<calculator>", "eval")
+
+class MCPError(Exception):
+    """Error JSON-RPC con código propio, devuelto tal cual al cliente"""
+    
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+class MCPSession:
+    """Estado propio de cada conexión de cliente"""
     
     def __init__(self):
         self.initialized = False
         self.workspace_root = os.getcwd()  # Directorio de trabajo actual
+        self.codec = JSON_CODEC  # Cambia tras initialize si se negocia msgpack
+
+class MCPServer:
+    """Servidor MCP para manipulación de archivos y terminal en VS Code
+    
+    Una única instancia (MCP_SERVER) atiende a todas las conexiones; el estado
+    de cada cliente vive en su MCPSession.
+    """
+    
+    def __init__(self):
         self.capabilities = {
             "tools": self._setup_tools(),
             "prompts": self._setup_prompts(),
             "resources": self._setup_resources()
         }
+        # El catálogo es estático: las respuestas de listado se codifican una sola
+        # vez por transporte
+        tools_list = {"tools": list(self.capabilities["tools"].values())}
+        prompts_list = {"prompts": list(self.capabilities["prompts"].values())}
+        self._tools_list_payload = {codec: codec.dumps(tools_list) for codec in CODECS}
+        self._prompts_list_payload = {codec: codec.dumps(prompts_list) for codec in CODECS}
+        # Variante resumida (solo nombre y descripción) para listados con summary=true;
+        # el esquema completo de una herramienta se pide después con tools/get
+        tools_summary = {"tools": [self._summarize(tool) for tool in tools_list["tools"]]}
+        prompts_summary = {"prompts": [self._summarize(prompt) for prompt in prompts_list["prompts"]]}
+        self._tools_summary_payload = {codec: codec.dumps(tools_summary) for codec in CODECS}
+        self._prompts_summary_payload = {codec: codec.dumps(prompts_summary) for codec in CODECS}
+        # Definición completa de cada herramienta para tools/get
+        self._tool_payloads = {
+            name: {codec: codec.dumps(tool) for codec in CODECS}
+            for name, tool in self.capabilities["tools"].items()
+        }
+        # Argumentos requeridos de cada prompt, para validar prompts/get con un
+        # único set difference
+        self._prompt_required_args = {
+            name: frozenset(arg["name"] for arg in prompt["arguments"] if arg.get("required"))
+            for name, prompt in self.capabilities["prompts"].items()
+        }
+        # La respuesta de initialize también es fija (con o sin transporte msgpack)
+        initialize_result = {
+            "protocolVersion": MCP_VERSION,
+            "capabilities": self.capabilities,
+            "serverInfo": {"name": "VS Code MCP Server", "version": "1.0.0"},
+            "instructions": "Servidor MCP para manipulación de archivos y terminal en VS Code"
+        }
+        initialize_result_msgpack = {
+            **initialize_result,
+            "capabilities": {**self.capabilities, "experimental": {"transport": "msgpack"}}
+        }
+        self._initialize_payload = {codec: codec.dumps(initialize_result) for codec in CODECS}
+        self._initialize_msgpack_payload = {codec: codec.dumps(initialize_result_msgpack) for codec in CODECS}
+        # Método JSON-RPC -> manejador; todos reciben los params de la solicitud
+        self._methods = {
+            "initialize": self.handle_initialize,
+            "initialized": self.handle_initialized,
+            "tools/list": self.handle_tools_list,
+            "tools/get": self.handle_tools_get,
+            "tools/call": self.handle_tools_call,
+            "prompts/list": self.handle_prompts_list,
+            "prompts/get": self.handle_prompts_get,
+            "terminal/execute": self.handle_terminal_execute
+        }
+        # Herramienta -> implementación, para resolver tools/call en O(1)
+        self._tool_handlers = {
+            "read_file": self._tool_read_file,
+            "write_file": self._tool_write_file,
+            "list_files": self._tool_list_files,
+            "create_directory": self._tool_create_directory,
+            "delete_path": self._tool_delete_path,
+            "run_command": self._tool_run_command,
+            "search_files": self._tool_search_files,
+            "file_info": self._tool_file_info,
+            "calculator": self._tool_calculator,
+            "terminal_execute": self.handle_terminal_execute,
+            "datetime": self._tool_datetime
+        }
     
     def _setup_tools(self) -> Dict[str, Any]:
         """Configura todas las herramientas disponibles"""
@@ -44,7 +497,8 @@ class MCPServer:
                 "inputSchema": {
                     "type": "object",
                     "properties": {
-                        "path": {"type": "string", "description": "Ruta del archivo"}
+                        "path": {"type": "string", "description": "Ruta del archivo"},
+                        "max_bytes": {"type": "integer", "description": "Máximo de bytes a leer (opcional)"}
                     },
                     "required": ["path"]
                 }
@@ -194,109 +648,89 @@ class MCPServer:
         """Configura recursos disponibles (para futuras extensiones)"""
         return {}
     
-    def _resolve_path(self, path: str) -> str:
+    def _resolve_path(self, path: str, session: MCPSession) -> str:
         """Resuelve una ruta relativa a absoluta dentro del workspace"""
+        # Las rutas absolutas se devuelven tal cual, sin ocupar la cache
         if os.path.isabs(path):
             return path
-        return os.path.normpath(os.path.join(self.workspace_root, path))
+        return _resolve_cached(session.workspace_root, path)
+    
+    @staticmethod
+    def _stat(path: str) -> Optional[os.stat_result]:
+        """os.stat que devuelve None si la ruta no existe"""
+        try:
+            return os.stat(path)
+        except FileNotFoundError:
+            return None
     
-    async def handle_request(self, request_data: str) -> str:
+    async def handle_request(self, request_data: bytes, session: MCPSession) -> bytes:
         """Maneja una solicitud MCP entrante"""
+        # initialize puede cambiar el transporte: su respuesta sale con el anterior
+        codec = session.codec
+        request_id = None
         try:
-            request = json.loads(request_data)
-            method = request.get("method", "")
-            params = request.get("params", {})
-            request_id = request.get("id")
+            method, params, request_id = codec.parse_request(request_data)
             
-            logger.info(f"Procesando método: {method}, ID: {request_id}")
+            logger.info("Procesando método: %s, ID: %s", method, request_id)
             
-            if method == "initialize":
-                result = await self.handle_initialize(params)
-                return self._create_response(request_id, result)
+            if not session.initialized and method not in ("initialize", "initialized"):
+                return self._create_error_response(codec, request_id, -32002, "Servidor no inicializado")
             
-            if not self.initialized and method != "initialized":
-                return self._create_error_response(request_id, -32002, "Servidor no inicializado")
+            handler = self._methods.get(method)
+            if handler is None:
+                return self._create_error_response(codec, request_id, -32601, f"Método no encontrado: {method}")
             
-            if method == "initialized":
-                result = await self.handle_initialized(params)
-                return "" if request_id is None else self._create_response(request_id, result)
-            
-            elif method == "tools/list":
-                result = await self.handle_tools_list()
-                return self._create_response(request_id, result)
-            
-            elif method == "tools/call":
-                result = await self.handle_tools_call(params)
-                return self._create_response(request_id, result)
-            
-            elif method == "prompts/list":
-                result = await self.handle_prompts_list()
-                return self._create_response(request_id, result)
-            
-            elif method == "prompts/get":
-                result = await self.handle_prompts_get(params)
-                return self._create_response(request_id, result)
-            elif method == "terminal/execute":
-                result = await self.handle_terminal_execute(params)
-                return self._create_response(request_id, result)
-            
-            else:
-                return self._create_error_response(request_id, -32601, f"Método no encontrado: {method}")
+            result = await handler(params, session)
+            return self._create_response(codec, request_id, result)
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Error decodificando JSON: {e}")
-            return self._create_error_response(None, -32700, "Error de análisis JSON")
+        except MCPError as e:
+            return self._create_error_response(codec, request_id, e.code, str(e))
+        except codec.validation_errors as e:
+            # MessagePack válido pero con una estructura que no es JSON-RPC: se
+            # responde siempre, con id null si no se puede recuperar (JSON-RPC 2.0)
+            error = codec.dumps({"code": -32600, "message": f"Solicitud inválida: {e}"})
+            return codec.envelope(codec.recover_id(request_data), codec.error_member, error)
+        except codec.decode_errors as e:
+            logger.error(f"Error decodificando {codec.name}: {e}")
+            return self._create_error_response(codec, None, -32700, "Error de análisis JSON")
         except Exception as e:
             logger.error(f"Error procesando solicitud: {e}")
-            return self._create_error_response(request_id, -32603, f"Error interno: {str(e)}")
+            return self._create_error_response(codec, request_id, -32603, f"Error interno: {str(e)}")
 
-    async def handle_terminal_execute(self, params):
+    async def handle_terminal_execute(self, params, session: MCPSession):
         """Ejecuta un comando en la terminal."""
         command = params.get("command")
         if not command:
-            return {"content": [{"type": "text", "text": "Comando no proporcionado"}]}
+            return session.codec.text_result("Comando no proporcionado")
 
         try:
-            process = subprocess.run(command, shell=True, capture_output=True, text=True, cwd=self.workspace_root)
-            stdout = process.stdout
-            stderr = process.stderr
-            return_code = process.returncode
-
-            return {
-                "content": [{"type": "text",
-                             "text": f"Comando ejecutado:\n{command}\n\nSalida:\n{stdout}\nErrores:\n{stderr}\nCódigo de retorno: {return_code}"}]
-            }
+            return_code, stdout, stderr = await _run_shell(command, session.workspace_root)
+
+            return session.codec.text_result(f"Comando ejecutado:\n{command}\n\nSalida:\n{stdout}\nErrores:\n{stderr}\nCódigo de retorno: {return_code}")
         except Exception as e:
             logger.error(f"Error al ejecutar el comando: {e}")
-            return {
-                "content": [{"type": "text", "text": f"Error al ejecutar el comando: {e}"}]
-            }
+            return session.codec.text_result(f"Error al ejecutar el comando: {e}")
 
     
-    def _create_response(self, request_id, result):
-        """Crea una respuesta JSON-RPC válida"""
+    def _create_response(self, codec, request_id, result):
+        """Crea una respuesta JSON-RPC válida
+        
+        Los manejadores devuelven el result ya codificado; solo las notificaciones
+        (None) pasan por el códec aquí.
+        """
         if request_id is None:
-            return ""
-        return json.dumps({
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "result": result
-        })
+            return b""
+        payload = result if isinstance(result, bytes) else codec.dumps(result)
+        return codec.envelope(request_id, codec.result_member, payload)
     
-    def _create_error_response(self, request_id, code, message):
+    def _create_error_response(self, codec, request_id, code, message):
         """Crea una respuesta de error JSON-RPC"""
         if request_id is None:
-            return ""
-        return json.dumps({
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "error": {
-                "code": code,
-                "message": message
-            }
-        })
+            return b""
+        error = codec.dumps({"code": code, "message": message})
+        return codec.envelope(request_id, codec.error_member, error)
     
-    async def handle_initialize(self, params):
+    async def handle_initialize(self, params, session: MCPSession):
         """Maneja la inicialización del servidor"""
         if params.get("protocolVersion") != MCP_VERSION:
             raise Exception(f"Versión de protocolo no soportada: {params.get('protocolVersion')}")
@@ -304,350 +738,220 @@ class MCPServer:
         # Establecer el directorio de trabajo si se proporciona
         workspace_dirs = params.get("workspaceFolders", [])
         if workspace_dirs:
-            self.workspace_root = workspace_dirs[0].get("uri", "").replace("file://", "")
+            session.workspace_root = workspace_dirs[0].get("uri", "").replace("file://", "")
             if os.name == 'nt':  # Windows
-                self.workspace_root = self.workspace_root.lstrip('/')
+                session.workspace_root = session.workspace_root.lstrip('/')
         
-        return {
-            "protocolVersion": MCP_VERSION,
-            "capabilities": self.capabilities,
-            "serverInfo": {"name": "VS Code MCP Server", "version": "1.0.0"},
-            "instructions": "Servidor MCP para manipulación de archivos y terminal en VS Code"
-        }
+        # La respuesta viaja con el códec vigente al recibir la solicitud
+        codec = session.codec
+        experimental = params.get("capabilities", {}).get("experimental", {})
+        if experimental.get("transport") == "msgpack" and MSGPACK_CODEC is not None:
+            session.codec = MSGPACK_CODEC
+            return self._initialize_msgpack_payload[codec]
+        return self._initialize_payload[codec]
     
-    async def handle_initialized(self, params):
+    async def handle_initialized(self, params, session: MCPSession):
         """Marca el servidor como inicializado"""
-        self.initialized = True
-        logger.info(f"Servidor MCP inicializado. Workspace: {self.workspace_root}")
+        session.initialized = True
+        logger.info(f"Servidor MCP inicializado. Workspace: {session.workspace_root}")
         return None
     
-    async def handle_tools_list(self):
-        """Lista todas las herramientas disponibles"""
-        return {"tools": list(self.capabilities["tools"].values())}
+    @staticmethod
+    def _summarize(definition: Dict[str, Any]) -> Dict[str, Any]:
+        """Reduce una herramienta o prompt a su nombre y descripción"""
+        return {"name": definition["name"], "description": definition["description"]}
+    
+    async def handle_tools_list(self, params, session: MCPSession):
+        """Lista todas las herramientas disponibles (solo resumen si summary=true)"""
+        payloads = self._tools_summary_payload if (params or {}).get("summary") else self._tools_list_payload
+        return payloads[session.codec]
+    
+    async def handle_tools_get(self, params, session: MCPSession):
+        """Devuelve la definición completa (con inputSchema) de una herramienta"""
+        tool_name = params.get("name")
+        payloads = self._tool_payloads.get(tool_name)
+        if payloads is None:
+            raise MCPError(-32602, f"Herramienta no encontrada: {tool_name}")
+        return payloads[session.codec]
     
-    async def handle_tools_call(self, params):
+    async def handle_tools_call(self, params, session: MCPSession):
         """Ejecuta una herramienta específica"""
         tool_name = params.get("name")
         arguments = params.get("arguments", {})
         
-        if tool_name == "read_file":
-            return await self._tool_read_file(arguments)
-        elif tool_name == "write_file":
-            return await self._tool_write_file(arguments)
-        elif tool_name == "list_files":
-            return await self._tool_list_files(arguments)
-        elif tool_name == "create_directory":
-            return await self._tool_create_directory(arguments)
-        elif tool_name == "delete_path":
-            return await self._tool_delete_path(arguments)
-        elif tool_name == "run_command":
-            return await self._tool_run_command(arguments)
-        elif tool_name == "search_files":
-            return await self._tool_search_files(arguments)
-        elif tool_name == "file_info":
-            return await self._tool_file_info(arguments)
-        elif tool_name == "calculator":
-            return await self._tool_calculator(arguments)
-        elif tool_name == "datetime":
-            return await self._tool_datetime(arguments)
+        handler = self._tool_handlers.get(tool_name)
+        if handler is not None:
+            return await handler(arguments, session)
         
-        return {"content": [{"type": "text", "text": f"Herramienta no encontrada: {tool_name}"}]}
+        return session.codec.text_result(f"Herramienta no encontrada: {tool_name}")
     
-    async def _tool_read_file(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """Lee el contenido de un archivo"""
-        path = self._resolve_path(arguments.get("path", ""))
+    async def _tool_read_file(self, arguments: Dict[str, Any], session: MCPSession) -> bytes:
+        """Lee el contenido de un archivo
+        
+        Es el único resultado con varios elementos de texto, así que no usa
+        text_result: las plantillas text_prefix/text_suffix solo envuelven un
+        elemento, y en msgpack la cabecera del array depende de cuántos haya.
+        """
+        path = self._resolve_path(arguments.get("path", ""), session)
+        max_bytes = arguments.get("max_bytes")
         
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            chunks, truncated = await _to_thread(_read_text_chunks, path, max_bytes)
             
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Contenido de {path}:\n\n{content}"
-                }]
-            }
+            # Cabecera y contenido en elementos separados para no copiar el archivo en un f-string
+            content = [{"type": "text", "text": f"Contenido de {path}:\n\n"}]
+            content.extend({"type": "text", "text": chunk} for chunk in chunks)
+            if truncated:
+                content.append({"type": "text", "text": f"\n\n[Contenido truncado en {max_bytes} bytes]"})
+            return session.codec.dumps({"content": content})
         except Exception as e:
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Error leyendo archivo {path}: {str(e)}"
-                }]
-            }
+            return session.codec.text_result(f"Error leyendo archivo {path}: {str(e)}")
     
-    async def _tool_write_file(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    async def _tool_write_file(self, arguments: Dict[str, Any], session: MCPSession) -> bytes:
         """Escribe contenido en un archivo"""
-        path = self._resolve_path(arguments.get("path", ""))
+        path = self._resolve_path(arguments.get("path", ""), session)
         content = arguments.get("content", "")
         append = arguments.get("append", False)
         
         try:
-            # Crear directorios padres si no existen
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-            
-            mode = 'a' if append else 'w'
-            with open(path, mode, encoding='utf-8') as f:
-                f.write(content)
+            await _to_thread(_write_text_file, path, content, append)
             
             action = "Añadido a" if append else "Escrito en"
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"{action} archivo: {path}"
-                }]
-            }
+            return session.codec.text_result(f"{action} archivo: {path}")
         except Exception as e:
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Error escribiendo archivo {path}: {str(e)}"
-                }]
-            }
+            return session.codec.text_result(f"Error escribiendo archivo {path}: {str(e)}")
     
-    async def _tool_list_files(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    async def _tool_list_files(self, arguments: Dict[str, Any], session: MCPSession) -> bytes:
         """Lista archivos y directorios en una ruta"""
         path = arguments.get("path", "")
-        target_path = self._resolve_path(path) if path else self.workspace_root
+        target_path = self._resolve_path(path, session) if path else session.workspace_root
         
         try:
-            if not os.path.exists(target_path):
-                return {
-                    "content": [{
-                        "type": "text", 
-                        "text": f"La ruta no existe: {target_path}"
-                    }]
-                }
+            if self._stat(target_path) is None:
+                return session.codec.text_result(f"La ruta no existe: {target_path}")
             
+            # (clave de orden, línea) en una sola pasada: directorios primero, luego archivos
             items = []
-            for item in os.listdir(target_path):
-                item_path = os.path.join(target_path, item)
-                is_dir = os.path.isdir(item_path)
-                items.append({
-                    "name": item,
-                    "type": "directory" if is_dir else "file",
-                    "size": os.path.getsize(item_path) if not is_dir else 0
-                })
+            # DirEntry reutiliza el tipo devuelto por readdir: un solo stat por archivo
+            with os.scandir(target_path) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if entry.is_dir():
+                        items.append(((False, name.lower()), f"[DIR]  {name}"))
+                    else:
+                        items.append(((True, name.lower()), f"[FILE] {name} ({entry.stat().st_size} bytes)"))
             
-            # Ordenar: directorios primero, luego archivos
-            items.sort(key=lambda x: (x["type"] != "directory", x["name"].lower()))
+            items.sort(key=lambda item: item[0])
+            items_text = "\n".join([line for _, line in items])
             
-            items_text = "\n".join([
-                f"[DIR]  {item['name']}" if item["type"] == "directory" 
-                else f"[FILE] {item['name']} ({item['size']} bytes)"
-                for item in items
-            ])
-            
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Contenido de {target_path}:\n\n{items_text}"
-                }]
-            }
+            return session.codec.text_result(f"Contenido de {target_path}:\n\n{items_text}")
         except Exception as e:
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Error listando directorio {target_path}: {str(e)}"
-                }]
-            }
+            return session.codec.text_result(f"Error listando directorio {target_path}: {str(e)}")
     
-    async def _tool_create_directory(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    async def _tool_create_directory(self, arguments: Dict[str, Any], session: MCPSession) -> bytes:
         """Crea un directorio"""
-        path = self._resolve_path(arguments.get("path", ""))
+        path = self._resolve_path(arguments.get("path", ""), session)
         
         try:
-            os.makedirs(path, exist_ok=True)
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Directorio creado: {path}"
-                }]
-            }
+            await _to_thread(os.makedirs, path, exist_ok=True)
+            return session.codec.text_result(f"Directorio creado: {path}")
         except Exception as e:
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Error creando directorio {path}: {str(e)}"
-                }]
-            }
+            return session.codec.text_result(f"Error creando directorio {path}: {str(e)}")
     
-    async def _tool_delete_path(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    async def _tool_delete_path(self, arguments: Dict[str, Any], session: MCPSession) -> bytes:
         """Elimina un archivo o directorio"""
-        path = self._resolve_path(arguments.get("path", ""))
+        path = self._resolve_path(arguments.get("path", ""), session)
         
         try:
             if not os.path.exists(path):
-                return {
-                    "content": [{
-                        "type": "text", 
-                        "text": f"La ruta no existe: {path}"
-                    }]
-                }
+                return session.codec.text_result(f"La ruta no existe: {path}")
             
             if os.path.isdir(path):
-                shutil.rmtree(path)
+                await _to_thread(shutil.rmtree, path)
                 action = "Directorio eliminado"
             else:
                 os.remove(path)
                 action = "Archivo eliminado"
             
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"{action}: {path}"
-                }]
-            }
+            return session.codec.text_result(f"{action}: {path}")
         except Exception as e:
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Error eliminando {path}: {str(e)}"
-                }]
-            }
+            return session.codec.text_result(f"Error eliminando {path}: {str(e)}")
     
-    async def _tool_run_command(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    async def _tool_run_command(self, arguments: Dict[str, Any], session: MCPSession) -> bytes:
         """Ejecuta un comando en la terminal"""
         command = arguments.get("command", "")
         cwd = arguments.get("cwd", "")
-        working_dir = self._resolve_path(cwd) if cwd else self.workspace_root
+        working_dir = self._resolve_path(cwd, session) if cwd else session.workspace_root
         
         try:
-            result = subprocess.run(
-                command,
-                shell=True,
-                cwd=working_dir,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+            returncode, stdout, stderr = await _run_shell(command, working_dir, timeout=30)
             
             output = {
-                "returncode": result.returncode,
-                "stdout": result.stdout,
-                "stderr": result.stderr
+                "returncode": returncode,
+                "stdout": stdout,
+                "stderr": stderr
             }
             
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Comando ejecutado en {working_dir}:\n{command}\n\nResultado:\n{json.dumps(output, indent=2)}"
-                }]
-            }
-        except subprocess.TimeoutExpired:
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"El comando tardó demasiado en ejecutarse: {command}"
-                }]
-            }
+            return session.codec.text_result(f"Comando ejecutado en {working_dir}:\n{command}\n\nResultado:\n{_json_pretty(output)}")
+        except asyncio.TimeoutError:
+            return session.codec.text_result(f"El comando tardó demasiado en ejecutarse: {command}")
         except Exception as e:
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Error ejecutando comando: {str(e)}"
-                }]
-            }
+            return session.codec.text_result(f"Error ejecutando comando: {str(e)}")
     
-    async def _tool_search_files(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    async def _tool_search_files(self, arguments: Dict[str, Any], session: MCPSession) -> bytes:
         """Busca archivos por nombre o patrón"""
         pattern = arguments.get("pattern", "")
         path = arguments.get("path", "")
-        search_path = self._resolve_path(path) if path else self.workspace_root
+        search_path = self._resolve_path(path, session) if path else session.workspace_root
         
         try:
-            found_files = []
-            for root, dirs, files in os.walk(search_path):
-                for file in files:
-                    if pattern in file or pattern == "*" or pattern == "*.*":
-                        found_files.append(os.path.join(root, file))
+            found_files = await _to_thread(_find_files, search_path, pattern)
             
             if not found_files:
-                return {
-                    "content": [{
-                        "type": "text", 
-                        "text": f"No se encontraron archivos con el patrón '{pattern}' en {search_path}"
-                    }]
-                }
+                return session.codec.text_result(f"No se encontraron archivos con el patrón '{pattern}' en {search_path}")
             
             files_text = "\n".join(found_files)
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Archivos encontrados con patrón '{pattern}' en {search_path}:\n\n{files_text}"
-                }]
-            }
+            return session.codec.text_result(f"Archivos encontrados con patrón '{pattern}' en {search_path}:\n\n{files_text}")
         except Exception as e:
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Error buscando archivos: {str(e)}"
-                }]
-            }
+            return session.codec.text_result(f"Error buscando archivos: {str(e)}")
     
-    async def _tool_file_info(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    async def _tool_file_info(self, arguments: Dict[str, Any], session: MCPSession) -> bytes:
         """Obtiene información detallada de un archivo"""
-        path = self._resolve_path(arguments.get("path", ""))
+        path = self._resolve_path(arguments.get("path", ""), session)
         
         try:
-            if not os.path.exists(path):
-                return {
-                    "content": [{
-                        "type": "text", 
-                        "text": f"La ruta no existe: {path}"
-                    }]
-                }
+            stats = self._stat(path)
+            if stats is None:
+                return session.codec.text_result(f"La ruta no existe: {path}")
             
-            stats = os.stat(path)
+            # Un único stat: el tipo se deriva del modo
+            is_file = stat.S_ISREG(stats.st_mode)
             file_info = {
                 "path": path,
                 "size": stats.st_size,
                 "modified": datetime.fromtimestamp(stats.st_mtime).isoformat(),
                 "created": datetime.fromtimestamp(stats.st_ctime).isoformat(),
-                "is_file": os.path.isfile(path),
-                "is_dir": os.path.isdir(path),
-                "extension": os.path.splitext(path)[1] if os.path.isfile(path) else ""
+                "is_file": is_file,
+                "is_dir": stat.S_ISDIR(stats.st_mode),
+                "extension": os.path.splitext(path)[1] if is_file else ""
             }
             
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Información del archivo:\n{json.dumps(file_info, indent=2)}"
-                }]
-            }
+            return session.codec.text_result(f"Información del archivo:\n{_json_pretty(file_info)}")
         except Exception as e:
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Error obteniendo información del archivo: {str(e)}"
-                }]
-            }
+            return session.codec.text_result(f"Error obteniendo información del archivo: {str(e)}")
     
-    async def _tool_calculator(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    async def _tool_calculator(self, arguments: Dict[str, Any], session: MCPSession) -> bytes:
         """Calculadora científica"""
         try:
-            result = eval(arguments["expression"], {"__builtins__": None}, math.__dict__)
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Resultado: {result}"
-                }]
-            }
+            code = _compile_expression(arguments["expression"])
+            result = eval(code, {"__builtins__": {}}, _CALC_EVAL_NAMESPACE)
+            return session.codec.text_result(f"Resultado: {result}")
         except Exception as e:
-            return {
-                "content": [{
-                    "type": "text", 
-                    "text": f"Error de cálculo: {str(e)}"
-                }]
-            }
+            return session.codec.text_result(f"Error de cálculo: {str(e)}")
     
-    async def _tool_datetime(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    async def _tool_datetime(self, arguments: Dict[str, Any], session: MCPSession) -> bytes:
         """Obtiene la fecha y hora actual"""
-        return {
-            "content": [{
-                "type": "text", 
-                "text": f"Fecha y hora actual: {datetime.now().isoformat()}"
-            }]
-        }
+        return session.codec.text_result(f"Fecha y hora actual: {datetime.now().isoformat()}")
 
 
     
@@ -656,104 +960,249 @@ class MCPServer:
 
 
     
-    async def handle_prompts_list(self):
-        """Lista todos los prompts disponibles"""
-        return {"prompts": list(self.capabilities["prompts"].values())}
+    async def handle_prompts_list(self, params, session: MCPSession):
+        """Lista todos los prompts disponibles (solo resumen si summary=true)"""
+        payloads = self._prompts_summary_payload if (params or {}).get("summary") else self._prompts_list_payload
+        return payloads[session.codec]
     
-    async def handle_prompts_get(self, params):
+    async def handle_prompts_get(self, params, session: MCPSession):
         """Obtiene un prompt específico"""
         prompt_name = params.get("name")
         arguments = params.get("arguments", {})
         
-        if prompt_name == "code_review":
-            return {
-                "description": "Revisión de código con enfoque en calidad",
+        prompt = self.capabilities["prompts"].get(prompt_name)
+        if prompt is None:
+            return session.codec.dumps({
+                "description": "Prompt no encontrado",
                 "messages": [{
                     "role": "user",
                     "content": {
-                        "type": "text",
-                        "text": f"Revisa este código {arguments.get('language', '')}:\n\n{arguments.get('code', '')}\n\nProporciona comentarios sobre calidad, posibles errores y optimizaciones."
+                        "type": "text", 
+                        "text": f"El prompt '{prompt_name}' no existe."
                     }
                 }]
-            }
+            })
         
-        elif prompt_name == "code_explanation":
-            return {
-                "description": "Explica el funcionamiento de un código",
-                "messages": [{
-                    "role": "user",
-                    "content": {
-                        "type": "text",
-                        "text": f"Explica cómo funciona este código {arguments.get('language', '')}:\n\n{arguments.get('code', '')}\n\nDescribe el propósito, las funciones principales y cualquier detalle importante."
-                    }
-                }]
-            }
+        missing = self._prompt_required_args[prompt_name] - arguments.keys()
+        if missing:
+            raise MCPError(-32602, f"Argumentos requeridos faltantes para {prompt_name}: {', '.join(sorted(missing))}")
         
-        elif prompt_name == "create_test":
-            framework = arguments.get("framework", "estándar")
-            return {
-                "description": "Genera tests para un código dado",
-                "messages": [{
-                    "role": "user",
-                    "content": {
-                        "type": "text",
-                        "text": f"Genera tests usando {framework} para este código {arguments.get('language', '')}:\n\n{arguments.get('code', '')}\n\nIncluye casos de prueba para diferentes escenarios."
-                    }
-                }]
-            }
+        text = _PROMPT_TEMPLATES[prompt_name].format(
+            language=arguments.get('language', ''),
+            code=arguments.get('code', ''),
+            framework=arguments.get("framework", "estándar")
+        )
         
-        return {
-            "description": "Prompt no encontrado",
+        return session.codec.dumps({
+            "description": prompt["description"],
             "messages": [{
                 "role": "user",
                 "content": {
-                    "type": "text", 
-                    "text": f"El prompt '{prompt_name}' no existe."
+                    "type": "text",
+                    "text": text
                 }
             }]
-        }
+        })
+
+MCP_SERVER = MCPServer()
+
+# Umbral del buffer de escritura a partir del cual se espera a drain()
+# (por debajo, el transporte envía solo)
+WRITE_HIGH_WATER = 64 * 1024
+# Solicitudes leídas por adelantado por conexión una vez inicializada la sesión
+PIPELINE_DEPTH = 64
+
+async def _send_frames(writer, frames: List[bytes]):
+    # writelines entrega el lote al transporte en una sola escritura
+    writer.writelines(frames)
+    if writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+        await writer.drain()
+
+def _log_response(addr, response: bytes):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Response enviado a %s: %s", addr, response.decode(errors="backslashreplace"))
+
+async def _pipeline_worker(writer, pending: asyncio.Queue, session: MCPSession, addr):
+    """Atiende las solicitudes ya leídas de una en una y en orden
+    
+    Mientras se procesa una solicitud el lector sigue recibiendo las siguientes,
+    pero los efectos de cada herramienta se aplican en el orden de llegada. Las
+    respuestas consecutivas que ya están listas se agrupan en un único lote.
+    """
+    failed = False
+    frames = []
+    while True:
+        if frames and pending.empty():
+            failed = await _flush_frames(writer, frames, failed, addr)
+            frames = []
+        item = await pending.get()
+        if item is None:
+            break
+        codec, request = item
+        task = asyncio.ensure_future(MCP_SERVER.handle_request(request, session))
+        if frames:
+            # Si la solicitud no termina enseguida, no hacer esperar a las respuestas ya listas
+            await asyncio.sleep(0)
+            if not task.done():
+                failed = await _flush_frames(writer, frames, failed, addr)
+                frames = []
+        response = await task
+        if response:
+            frames.append(codec.frame(response))
+            _log_response(addr, response)
+    if frames:
+        await _flush_frames(writer, frames, failed, addr)
+
+async def _flush_frames(writer, frames: List[bytes], failed: bool, addr) -> bool:
+    """Envía un lote; devuelve True si la conexión ya no admite escrituras"""
+    # Tras un fallo se siguen procesando las solicitudes para no bloquear al lector
+    if failed or writer.is_closing():
+        return True
+    try:
+        await _send_frames(writer, frames)
+    except Exception as e:
+        logger.error(f"Error enviando respuesta a {addr}: {e}")
+        return True
+    return False
 
 async def handle_client(reader, writer):
     """Maneja una conexión de cliente TCP"""
-    mcp_server = MCPServer()
+    session = MCPSession()
     addr = writer.get_extra_info('peername')
     logger.info(f"Conexión recibida de {addr}")
+    pending = None
+    worker = None
 
     try:
         while True:
-            data = await reader.readline()
-            if not data:
+            codec = session.codec
+            request = await codec.read_message(reader)
+            if request is None:
                 break
-
-            request = data.decode().strip()
             if not request:
                 continue
 
-            logger.debug(f"Request recibido: {request}")
-            response = await mcp_server.handle_request(request)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Request recibido de %s: %s", addr, request.decode(errors="backslashreplace"))
             
+            if pending is not None:
+                # Sesión inicializada: se sigue leyendo mientras el worker procesa
+                await pending.put((codec, request))
+                continue
+            
+            # Hasta completar el handshake (y negociar el códec) se atiende en serie
+            response = await MCP_SERVER.handle_request(request, session)
             if response:
-                writer.write(response.encode() + b'\n')
-                await writer.drain()
-                logger.debug(f"Response enviado: {response}")
+                await _send_frames(writer, [codec.frame(response)])
+                _log_response(addr, response)
+            if session.initialized:
+                pending = asyncio.Queue(PIPELINE_DEPTH)
+                worker = asyncio.ensure_future(_pipeline_worker(writer, pending, session, addr))
             
     except Exception as e:
         logger.error(f"Error con {addr}: {e}")
     finally:
+        if worker is not None:
+            # Procesar y enviar las solicitudes pendientes antes de cerrar
+            await pending.put(None)
+            await worker
         writer.close()
         await writer.wait_closed()
         logger.info(f"Conexión cerrada: {addr}")
 
-async def main():
+def _worker_count() -> int:
+    """Lee MCP_WORKERS: un número, o "auto" para un proceso por CPU"""
+    value = os.getenv("MCP_WORKERS", "1").strip()
+    if value == "auto":
+        return os.cpu_count() or 1
+    try:
+        return max(1, int(value))
+    except ValueError:
+        logger.warning("MCP_WORKERS inválido (%r); se usa un solo proceso", value)
+        return 1
+
+def _supervise(children: List[int]) -> int:
+    """Espera a los workers y les reenvía SIGTERM/SIGINT hasta que terminen todos
+    
+    Devuelve el código de salida del supervisor: 1 si algún worker falló.
+    """
+    forwarded = set()
+    
+    def forward(signum, frame):
+        forwarded.add(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    logger.info(f"Supervisando {len(children)} workers (PID {os.getpid()})")
+    failed = False
+    while children:
+        try:
+            pid, status = os.waitpid(-1, 0)
+        except ChildProcessError:
+            break
+        if pid in children:
+            children.remove(pid)
+            if os.WIFSIGNALED(status):
+                signum = os.WTERMSIG(status)
+                logger.info(f"Worker {pid} terminado por la señal {signum}")
+                # Terminar por una señal reenviada es una parada normal
+                failed = failed or signum not in forwarded
+            else:
+                code = os.WEXITSTATUS(status)
+                logger.info(f"Worker {pid} terminado con código {code}")
+                failed = failed or code != 0
+    return 1 if failed else 0
+
+def _fork_workers() -> int:
+    """Crea MCP_WORKERS procesos hijo que comparten el puerto
+    
+    Cada proceso tiene su propio event loop y el kernel reparte las conexiones
+    entre ellos (SO_REUSEPORT). MCP_SERVER ya está construido, así que los
+    hijos lo heredan del padre sin reconstruirlo. El padre no atiende
+    conexiones: supervisa a los hijos y termina cuando terminan todos. En los
+    hijos devuelve el número de procesos que escuchan en el puerto.
+    """
+    workers = _worker_count()
+    if workers > 1 and not (hasattr(os, "fork") and hasattr(socket, "SO_REUSEPORT")):
+        logger.warning("MCP_WORKERS requiere fork y SO_REUSEPORT; se usa un solo proceso")
+        return 1
+    if workers == 1:
+        return 1
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            # Grupo propio: Ctrl+C llega una sola vez, reenviado por el padre
+            os.setpgid(0, 0)
+            return workers
+        children.append(pid)
+    sys.exit(_supervise(children))
+
+async def main(reuse_port: bool = False):
     """Función principal del servidor MCP"""
-    server = await asyncio.start_server(handle_client, '127.0.0.1', 8888)
+    server = await asyncio.start_server(
+        handle_client, '127.0.0.1', 8888, limit=READ_LIMIT, reuse_port=reuse_port
+    )
     
     async with server:
-        logger.info("Servidor MCP para VS Code ejecutándose en 127.0.0.1:8888")
+        logger.info(f"Servidor MCP para VS Code ejecutándose en 127.0.0.1:8888 (PID {os.getpid()})")
         await server.serve_forever()
 
 if __name__ == "__main__":
+    workers = _fork_workers()
+    run_kwargs = {}
+    if uvloop is not None:
+        # uvloop.install() está obsoleto desde Python 3.12
+        if sys.version_info >= (3, 12):
+            run_kwargs["loop_factory"] = uvloop.new_event_loop
+        else:
+            uvloop.install()
     try:
-        asyncio.run(main())
+        asyncio.run(main(reuse_port=workers > 1), **run_kwargs)
     except KeyboardInterrupt:
-        logger.info("Servidor detenido por el usuario")
\ No newline at end of file
+        logger.info("Servidor detenido por el usuario")
@@ -7,160 +7,216 @@ Prueba todas las funcionalidades de manipulación de archivos y terminal
 import asyncio
 import json
 import os
-
-async def mcp_client():
-    reader, writer = await asyncio.open_connection('localhost', 8888)
-
-    # 1. Send initialize request
-    initialize_request = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "initialize",
-        "params": {
-            "protocolVersion": "2024-11-05",
-            "clientInfo": {
-                "name": "VS Code MCP Client",
-                "version": "0.1.0"
-            },
-            "capabilities": {},
-            "workspaceFolders": [
-                {
-                    "uri": f"file://{os.getcwd()}",
-                    "name": "TestWorkspace"
-                }
-            ]
-        }
-    }
-    print("--> initialize")
-    writer.write(json.dumps(initialize_request).encode() + b'\n')
-    await writer.drain()
-    await asyncio.sleep(0.1)
-
-    # 2. Receive initialize response
-    response = await reader.readline()
-    print("<--", json.loads(response.decode()))
-    await asyncio.sleep(0.1)
-
-    # 3. Send initialized notification
-    initialized_notification = {
-        "jsonrpc": "2.0",
-        "method": "initialized",
-        "params": {}
+import sys
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the standard library
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:  # optional (not available on Windows)
+    uvloop = None
+
+if orjson is not None:
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+else:
+    def _json_dumps(obj):
+        return json.dumps(obj).encode()
+
+    _json_loads = json.loads
+
+# Stream buffer limit: large read_file/list_files responses exceed the 64 KiB default
+READ_LIMIT = 8 * 1024 * 1024
+
+def _frame(request):
+    return _json_dumps(request) + b'\n'
+
+# Workspace URI, resolved once per run
+_WS_URI = f"file://{os.getcwd()}"
+
+# Requests encoded once when the module loads
+
+# Initialize request
+INITIALIZE_REQUEST = _frame({
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2024-11-05",
+        "clientInfo": {
+            "name": "VS Code MCP Client",
+            "version": "0.1.0"
+        },
+        "capabilities": {},
+        "workspaceFolders": [
+            {
+                "uri": _WS_URI,
+                "name": "TestWorkspace"
+            }
+        ]
     }
-    print("--> initialized")
-    writer.write(json.dumps(initialized_notification).encode() + b'\n')
-    await writer.drain()
-    await asyncio.sleep(0.1)
-
-    # 4. Test tools/call with datetime
-    tool_call_request = {
-        "jsonrpc": "2.0",
-        "id": 2,
-        "method": "tools/call",
-        "params": {
-            "name": "datetime",
-            "arguments": {}
-        }
+})
+
+# Initialized notification
+INITIALIZED_NOTIFICATION = _frame({
+    "jsonrpc": "2.0",
+    "method": "initialized",
+    "params": {}
+})
+
+# Test tools/call with datetime
+DATETIME_REQUEST = _frame({
+    "jsonrpc": "2.0",
+    "id": 2,
+    "method": "tools/call",
+    "params": {
+        "name": "datetime",
+        "arguments": {}
     }
-    print("--> tools/call (datetime)")
-    writer.write(json.dumps(tool_call_request).encode() + b'\n')
-    await writer.drain()
-    await asyncio.sleep(0.1)
-
-    # 5. Receive tools/call response for datetime
-    response = await reader.readline()
-    print("<--", json.loads(response.decode()))
-    await asyncio.sleep(0.1)
-
-    # 6. Test write_file
-    write_file_request = {
-        "jsonrpc": "2.0",
-        "id": 3,
-        "method": "tools/call",
-        "params": {
-            "name": "write_file",
-            "arguments": {
-                "path": "test_file.txt",
-                "content": "Este es un archivo de prueba\nCreado por el servidor MCP\n"
-            }
+})
+
+# Test write_file
+WRITE_FILE_REQUEST = _frame({
+    "jsonrpc": "2.0",
+    "id": 3,
+    "method": "tools/call",
+    "params": {
+        "name": "write_file",
+        "arguments": {
+            "path": "test_file.txt",
+            "content": "Este es un archivo de prueba\nCreado por el servidor MCP\n"
         }
     }
-    print("--> tools/call (write_file)")
-    writer.write(json.dumps(write_file_request).encode() + b'\n')
-    await writer.drain()
-    await asyncio.sleep(0.1)
-
-    # 7. Receive write_file response
-    response = await reader.readline()
-    print("<--", json.loads(response.decode()))
-    await asyncio.sleep(0.1)
-
-    # 8. Test read_file
-    read_file_request = {
-        "jsonrpc": "2.0",
-        "id": 4,
-        "method": "tools/call",
-        "params": {
-            "name": "read_file",
-            "arguments": {
-                "path": "test_file.txt"
-            }
+})
+
+# Test read_file
+READ_FILE_REQUEST = _frame({
+    "jsonrpc": "2.0",
+    "id": 4,
+    "method": "tools/call",
+    "params": {
+        "name": "read_file",
+        "arguments": {
+            "path": "test_file.txt"
         }
     }
-    print("--> tools/call (read_file)")
-    writer.write(json.dumps(read_file_request).encode() + b'\n')
-    await writer.drain()
-    await asyncio.sleep(0.1)
-
-    # 9. Receive read_file response
-    response = await reader.readline()
-    print("<--", json.loads(response.decode()))
-    await asyncio.sleep(0.1)
-
-    # 10. Test list_files
-    list_files_request = {
-        "jsonrpc": "2.0",
-        "id": 5,
-        "method": "tools/call",
-        "params": {
-            "name": "list_files",
-            "arguments": {}
-        }
+})
+
+# Test list_files
+LIST_FILES_REQUEST = _frame({
+    "jsonrpc": "2.0",
+    "id": 5,
+    "method": "tools/call",
+    "params": {
+        "name": "list_files",
+        "arguments": {}
     }
-    print("--> tools/call (list_files)")
-    writer.write(json.dumps(list_files_request).encode() + b'\n')
-    await writer.drain()
-    await asyncio.sleep(0.1)
-
-    # 11. Receive list_files response
-    response = await reader.readline()
-    print("<--", json.loads(response.decode()))
-    await asyncio.sleep(0.1)
-
-    # 12. Test run_command
-    run_command_request = {
-        "jsonrpc": "2.0",
-        "id": 6,
-        "method": "tools/call",
-        "params": {
-            "name": "run_command",
-            "arguments": {
-                "command": "echo 'Hola desde MCP'"
-            }
+})
+
+# Test run_command
+RUN_COMMAND_REQUEST = _frame({
+    "jsonrpc": "2.0",
+    "id": 6,
+    "method": "tools/call",
+    "params": {
+        "name": "run_command",
+        "arguments": {
+            "command": "echo 'Hola desde MCP'"
         }
     }
-    print("--> tools/call (run_command)")
-    writer.write(json.dumps(run_command_request).encode() + b'\n')
-    await writer.drain()
-    await asyncio.sleep(0.1)
+})
+
+async def read_responses(reader, pending):
+    """Resolves the future registered for each response id until the server closes"""
+    try:
+        while True:
+            try:
+                response = _json_loads(await reader.readuntil(b'\n'))
+            except asyncio.IncompleteReadError:
+                break
+            future = pending.pop(response.get("id"), None)
+            if future is not None:
+                future.set_result(response)
+    except (asyncio.LimitOverrunError, ValueError) as e:
+        # ValueError also covers JSON decode errors (json and orjson)
+        print("Error reading response:", e)
+    finally:
+        # Nothing else will answer: don't leave gather() waiting
+        for future in pending.values():
+            future.cancel()
+        pending.clear()
+
+def send_requests(writer, pending, requests):
+    """Sends several (label, id, frame) requests with one write and returns the
+    futures of their responses; notifications (id None) get no future"""
+    loop = asyncio.get_running_loop()
+    futures = []
+    for label, request_id, _ in requests:
+        print("-->", label)
+        if request_id is not None:
+            pending[request_id] = loop.create_future()
+            futures.append(pending[request_id])
+    writer.writelines([frame for _, _, frame in requests])
+    return futures
+
+async def print_response(future):
+    """Prints a response when it arrives; returns None if the connection closed first"""
+    try:
+        response = await future
+    except asyncio.CancelledError:
+        if not future.cancelled():
+            raise
+        print("<-- no response (connection closed)")
+        return None
+    print("<--", response)
+    return response
 
-    # 13. Receive run_command response
-    response = await reader.readline()
-    print("<--", json.loads(response.decode()))
-    await asyncio.sleep(0.1)
+async def mcp_client():
+    reader, writer = await asyncio.open_connection('localhost', 8888, limit=READ_LIMIT)
+    pending = {}
+    receiver = asyncio.ensure_future(read_responses(reader, pending))
+
+    # 1. Send the handshake and the independent calls in a single write. The
+    # server handles requests up to "initialized" in order, then keeps reading
+    # ahead; responses are matched to their request by id.
+    initialize, datetime, write_file = send_requests(writer, pending, [
+        ("initialize", 1, INITIALIZE_REQUEST),
+        ("initialized", None, INITIALIZED_NOTIFICATION),
+        ("tools/call (datetime)", 2, DATETIME_REQUEST),
+        ("tools/call (write_file)", 3, WRITE_FILE_REQUEST),
+    ])
+    await writer.drain()
 
-    # 14. Close connection
+    # read_file, list_files and run_command should see the written file
+    async def after_write():
+        if await print_response(write_file) is None:
+            return
+        responses = send_requests(writer, pending, [
+            ("tools/call (read_file)", 4, READ_FILE_REQUEST),
+            ("tools/call (list_files)", 5, LIST_FILES_REQUEST),
+            ("tools/call (run_command)", 6, RUN_COMMAND_REQUEST),
+        ])
+        await writer.drain()
+        for response in responses:
+            await print_response(response)
+
+    await print_response(initialize)
+    await asyncio.gather(print_response(datetime), after_write())
+
+    # 2. Close connection
     writer.close()
     await writer.wait_closed()
-
-asyncio.run(mcp_client())
\ No newline at end of file
+    await receiver
+
+if __name__ == "__main__":
+    run_kwargs = {}
+    if uvloop is not None:
+        # uvloop.install() is deprecated since Python 3.12
+        if sys.version_info >= (3, 12):
+            run_kwargs["loop_factory"] = uvloop.new_event_loop
+        else:
+            uvloop.install()
+    asyncio.run(mcp_client(), **run_kwargs)
\ No newline at end of file
@@ -1,97 +1,410 @@
 #!/usr/bin/env python3
 
 import asyncio
+import codecs
+import itertools
 import json
+from dataclasses import dataclass, field
+from typing import Any, Dict
 import os #revisar doc
-import subprocess
+import shlex
 import sys
+import threading
 
-# Global variables for the MCP connection
-mcp_reader = None
-mcp_writer = None
-mcp_initialized = False
+try:
+    import orjson
+except ImportError:  # optional: fall back to the standard library
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:  # optional (not available on Windows)
+    uvloop = None
+
+if orjson is not None:
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+else:
+    def _json_dumps(obj):
+        return json.dumps(obj).encode()
+
+    _json_loads = json.loads
+
+# Workspace URI, resolved once per run
+_WS_URI = f"file://{os.getcwd()}"
+
+# Requests encoded once when the module loads
+INITIALIZE_REQUEST = _json_dumps({
+    "jsonrpc": "2.0",
+    "id": 0,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2024-11-05",
+        "clientInfo": {
+            "name": "MCP Terminal",
+            "version": "0.1.0"
+        },
+        "capabilities": {},
+        "workspaceFolders": [
+            {
+                "uri": _WS_URI,
+                "name": "MCPWorkspace"
+            }
+        ]
+    }
+}) + b'\n'
+
+INITIALIZED_NOTIFICATION = _json_dumps({
+    "jsonrpc": "2.0",
+    "method": "initialized",
+    "params": {}
+}) + b'\n'
+
+# Largest chunk read from the local model's stdout at a time
+LOCAL_READ_SIZE = 64 * 1024
+
+# terminal/execute frame around the request id and the JSON-encoded command
+EXECUTE_PREFIX = b'{"jsonrpc":"2.0","id":'
+EXECUTE_MIDDLE = b',"method":"terminal/execute","params":{"command":'
+EXECUTE_SUFFIX = b'}}\n'
+
+class MCPClientProtocol(asyncio.BufferedProtocol):
+    """
+    Receives newline-delimited JSON-RPC messages straight into a reusable
+    buffer, instead of going through a StreamReader, and dispatches each
+    complete message as soon as it arrives.
+    """
+
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, on_message, on_close):
+        self._buffer = bytearray(self.BUFFER_SIZE)
+        self._used = 0       # Bytes of the buffer holding received data
+        self._scanned = 0    # Bytes already searched for a newline
+        self._on_message = on_message
+        self._on_close = on_close
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def get_buffer(self, sizehint):
+        if self._used == len(self._buffer):
+            # A single message is larger than the buffer: grow it
+            buffer = bytearray(len(self._buffer) * 2)
+            buffer[:self._used] = self._buffer[:self._used]
+            self._buffer = buffer
+        return memoryview(self._buffer)[self._used:]
+
+    def buffer_updated(self, nbytes):
+        self._used += nbytes
+        buffer = self._buffer
+        start = 0
+        while True:
+            end = buffer.find(b'\n', max(start, self._scanned), self._used)
+            if end < 0:
+                break
+            if end > start:
+                self._on_message(buffer[start:end])
+            start = end + 1
+        if start:
+            # Move the incomplete message (if any) to the front
+            remaining = self._used - start
+            buffer[:remaining] = buffer[start:self._used]
+            self._used = remaining
+        self._scanned = self._used
+
+    def connection_lost(self, exc):
+        self._on_close(exc)
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+@dataclass
+class MCPConnection:
+    """
+    State of the connection to the MCP server, passed explicitly instead of
+    living in module globals.
+    """
+    transport: Any = None
+    protocol: Any = None
+    initialized: bool = False
+    pending: Dict[int, asyncio.Future] = field(default_factory=dict)  # Request id -> future resolved when its response arrives
+    request_ids: Any = field(default_factory=lambda: itertools.count(1))  # id 0 is the initialize request
+
+    def dispatch_message(self, data):
+        """
+        Handles one message from the MCP server. Each response resolves the future
+        waiting on its id, so several requests can be in flight at once; server
+        notifications are printed as they arrive.
+        """
+        try:
+            message = _json_loads(data)
+        except ValueError as e:
+            print(f"Error reading from MCP server: {e}")
+            return
+        if "id" in message:
+            future = self.pending.pop(message["id"], None)
+            if future is not None and not future.done():
+                future.set_result(message)
+        else:
+            print(f"<-- MCP Notification: {message}")
+
+    def connection_lost(self, exc):
+        self.initialized = False
+        if exc is not None:
+            print(f"Error reading from MCP server: {exc}")
+        # Wake up the callers still waiting for a response
+        for future in self.pending.values():
+            if not future.done():
+                future.set_result(None)
+        self.pending.clear()
+
+    async def close(self):
+        if self.transport:
+            self.transport.close()
+            await self.protocol.closed
 
 async def initialize_mcp_server(config):
     """
     Initializes the connection to the MCP server.
     """
-    global mcp_reader, mcp_writer, mcp_initialized
+    connection = MCPConnection()
     try:
-        mcp_reader, mcp_writer = await asyncio.open_connection(config['mcp_server']['host'], config['mcp_server']['port'])
+        loop = asyncio.get_running_loop()
+        connection.transport, connection.protocol = await loop.create_connection(
+            lambda: MCPClientProtocol(connection.dispatch_message, connection.connection_lost),
+            config['mcp_server']['host'], config['mcp_server']['port']
+        )
 
         # 1. Send initialize request
-        initialize_request = {
-            "jsonrpc": "2.0",
-            "id": 0,
-            "method": "initialize",
-            "params": {
-                "protocolVersion": "2024-11-05",
-                "clientInfo": {
-                    "name": "MCP Terminal",
-                    "version": "0.1.0"
-                },
-                "capabilities": {},
-                "workspaceFolders": [
-                    {
-                        "uri": f"file://{os.getcwd()}",
-                        "name": "MCPWorkspace"
-                    }
-                ]
-            }
-        }
+        response_future = loop.create_future()
+        connection.pending[0] = response_future
         print("--> MCP Initialize")
-        mcp_writer.write(json.dumps(initialize_request).encode() + b'\n')
-        await mcp_writer.drain()
+        connection.transport.write(INITIALIZE_REQUEST)
 
         # 2. Receive initialize response
-        response = await mcp_reader.readline()
-        print(f"<-- MCP Response: {json.loads(response.decode())}")
+        response = await response_future
+        if response is None:
+            raise ConnectionError("connection closed before the initialize response")
+        print(f"<-- MCP Response: {response}")
 
         # 3. Send initialized notification
-        initialized_notification = {
-            "jsonrpc": "2.0",
-            "method": "initialized",
-            "params": {}
-        }
         print("--> MCP Initialized")
-        mcp_writer.write(json.dumps(initialized_notification).encode() + b'\n')
-        await mcp_writer.drain()
-        mcp_initialized = True
+        connection.transport.write(INITIALIZED_NOTIFICATION)
+        connection.initialized = True
         print("MCP Server Initialized Successfully.")
 
     except Exception as e:
         print(f"Error initializing MCP server: {e}")
-        mcp_initialized = False
+        connection.initialized = False
+    return connection
+
+
+async def request_mcp(connection, message):
+    """
+    Sends a message over the MCP connection and returns the line to print for
+    it, so callers decide when the result is shown.
+    """
+    if not connection.initialized:
+        return "MCP Server not initialized. Please restart the terminal."
+
+    try:
+        # Simplified terminal/execute request (adjust as needed for your MCP server);
+        # only the id and the command are encoded per call
+        request_id = next(connection.request_ids)
+        response_future = asyncio.get_running_loop().create_future()
+        pending = connection.pending
+        pending[request_id] = response_future
+        try:
+            connection.transport.writelines((EXECUTE_PREFIX, str(request_id).encode(), EXECUTE_MIDDLE, _json_dumps(message), EXECUTE_SUFFIX))
+            response = await response_future
+        finally:
+            pending.pop(request_id, None)
+        if response is None:
+            return "MCP Server connection closed. Please restart the terminal."
+        return f"<-- MCP Response: {response}"
+
+    except Exception as e:
+        return f"Error communicating with MCP server: {e}"
+
+
+async def run_mcp_client(connection, message):
+    """
+    Sends a message over the MCP connection and prints the result.
+    """
+    print(await request_mcp(connection, message))
 
 
-async def run_mcp_client(config, message):
+async def stop_local_model(process):
     """
-    Connects to the MCP server and sends a message.
+    Closes a local model process that is still running.
     """
-    global mcp_reader, mcp_writer, mcp_initialized
-    if not mcp_initialized:
-        print("MCP Server not initialized. Please restart the terminal.")
+    if process is None or process.returncode is not None:
         return
+    if process.stdin and not process.stdin.is_closing():
+        process.stdin.close()
+    try:
+        await asyncio.wait_for(process.wait(), 5)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+async def stream_local_output(stdout, terminator=None):
+    """
+    Prints the local model's answer as it is generated. Returns False when
+    stdout closes before the terminator shows up.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    # Bytes that may be the start of a terminator split across two reads
+    keep = len(terminator) - 1 if terminator else 0
+    pending = b''
+    sys.stdout.write("Local Model Output: ")
+    while True:
+        data = await stdout.read(LOCAL_READ_SIZE)
+        if not data:
+            print(decoder.decode(pending, True))
+            return terminator is None
+        pending += data
+        if terminator:
+            end = pending.find(terminator)
+            if end >= 0:
+                print(decoder.decode(pending[:end], True))
+                return True
+        ready = len(pending) - keep
+        if ready > 0:
+            sys.stdout.write(decoder.decode(pending[:ready]))
+            sys.stdout.flush()
+            pending = pending[ready:]
+
 
+async def ask_local_model(process, command, user_input, terminator):
+    """
+    Sends the user input to the local model and streams its answer. Returns the
+    process to reuse on the next turn, or None when it has to be started again.
+    """
     try:
-        # Craft a simplified request (adjust as needed for your MCP server)
-        request = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "terminal/execute",
-            "params": {
-                "command": message
-            }
-        }
+        if terminator:
+            # Reuse the running model; start it only the first time or after it exits
+            if process is None or process.returncode is not None:
+                process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+        else:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
 
-        mcp_writer.write(json.dumps(request).encode() + b'\n')
-        await mcp_writer.drain()
+        # Send input to the local model; a one-shot model reads until EOF
+        process.stdin.write((user_input + '\n').encode())
+        await process.stdin.drain()
+        if not terminator:
+            process.stdin.close()
 
-        response = await mcp_reader.readline()
-        print(f"<-- MCP Response: {json.loads(response.decode())}")
+        finished = await stream_local_output(process.stdout, terminator)
+        if not terminator:
+            await process.wait()
+            return None
+        if not finished:
+            print("Local model exited before printing its terminator; it will be restarted.")
+            await stop_local_model(process)
+            return None
+        return process
 
     except Exception as e:
-        print(f"Error communicating with MCP server: {e}")
+        print(f"Error interacting with local model: {e}")
+        return process
+
+
+def split_command(command):
+    """
+    Turns local_model.command into an argv list. A list is used as is; a string
+    is split with shlex, in non-POSIX mode on Windows so backslashes in paths
+    such as C:\\tools\\model.exe are kept.
+    """
+    if isinstance(command, list):
+        if not all(isinstance(arg, str) for arg in command):
+            raise ValueError("local_model.command must be a string or a list of strings")
+        return command
+    if os.name != 'nt':
+        return shlex.split(command)
+    # Non-POSIX mode keeps the quotes around an argument: drop them
+    return [arg[1:-1] if len(arg) > 1 and arg[0] == arg[-1] and arg[0] in '"\'' else arg
+            for arg in shlex.split(command, posix=False)]
+
+
+def local_model_settings(config):
+    """
+    Reads the local model command and, in persistent mode, its terminator.
+    Raises KeyError or ValueError when the local_model section is invalid.
+    """
+    local_model = config['local_model']
+    command = split_command(local_model['command'])
+    if not command:
+        raise ValueError("local_model.command is empty")
+    # Opt-in: keep one local model process alive across turns. The model must
+    # print the configured terminator after each answer so replies can be split.
+    terminator = None
+    if local_model.get('persistent'):
+        terminator = local_model.get('terminator', '').encode()
+        if not terminator:
+            print("Warning: local_model.persistent requires local_model.terminator; starting the model on every turn.")
+            terminator = None
+    return command, terminator
+
+
+class StdinReader:
+    """
+    Reads stdin lines in a daemon thread and hands them to the event loop.
+    The thread uses os.read rather than input(), so it holds no Python-level
+    lock on stdin, and shutdown never waits for a prompt that is still open.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._lines = asyncio.Queue()
+        self._thread = None
+
+    def _run(self):
+        pending = b''
+        try:
+            fd = sys.stdin.fileno()
+            while True:
+                data = os.read(fd, 4096)
+                if not data:
+                    break
+                pending += data
+                *lines, pending = pending.split(b'\n')
+                for line in lines:
+                    # Like input(): no line ending, also for Windows CRLF input
+                    self._put(line.rstrip(b'\r'))
+        except (OSError, ValueError):
+            pass  # stdin closed or unavailable: same as EOF
+        if pending:
+            self._put(pending.rstrip(b'\r'))
+        self._put(None)
+
+    def _put(self, line):
+        try:
+            self._loop.call_soon_threadsafe(self._lines.put_nowait, line)
+        except RuntimeError:
+            pass  # The loop already closed
+
+    async def readline(self, prompt):
+        """Like input(prompt): raises EOFError once stdin is exhausted"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        sys.stdout.write(prompt)
+        sys.stdout.flush()
+        line = await self._lines.get()
+        if line is None:
+            self._lines.put_nowait(None)
+            raise EOFError
+        return line.decode(sys.stdin.encoding or 'utf-8', errors='replace')
 
 
 async def main():
@@ -99,8 +412,9 @@ async def main():
     Main function to run the terminal application.
     """
     try:
-        with open('terminal_interface_config.json', 'r') as f:
-            config = json.load(f)
+        # Read as bytes so orjson (when installed) parses it without a str copy
+        with open('terminal_interface_config.json', 'rb') as f:
+            config = _json_loads(f.read())
     except FileNotFoundError:
         print("Error: terminal_interface_config.json not found.")
         sys.exit(1)
@@ -109,21 +423,30 @@ async def main():
         sys.exit(1)
 
     # Initialize MCP Server
-    await initialize_mcp_server(config)
+    mcp = await initialize_mcp_server(config)
 
     current_model = "cloud"  # Default model
     local_process = None # To store the local model subprocess
+    local_settings = None # (command, terminator), read on the first local turn
     print(f"Loaded configuration.  Using {current_model} model initially.")
 
+    # Settings that do not change while the terminal runs
+    prompt = config['prompt']
+    cloud_model_name = config['cloud_model']['name']
+
+    stdin = StdinReader()
     while True:
-        prompt = config['prompt']
-        user_input = input(prompt)
+        try:
+            user_input = await stdin.readline(prompt)
+        except (EOFError, KeyboardInterrupt, asyncio.CancelledError):
+            # Ctrl-D or Ctrl-C at the prompt quit like 'exit'
+            print()
+            user_input = 'exit'
 
         if user_input.lower() == 'exit':
             print("Exiting...")
-            if mcp_writer:
-                mcp_writer.close()
-                await mcp_writer.wait_closed()
+            await stop_local_model(local_process)
+            await mcp.close()
             break
         elif user_input.lower() == 'switch':
             if current_model == "cloud":
@@ -137,38 +460,35 @@ async def main():
 
         # Process the user input based on the selected model
         if current_model == "cloud":
-            print(f"Sending to cloud model ({config['cloud_model']['name']}): {user_input}")
+            print(f"Sending to cloud model ({cloud_model_name}): {user_input}")
             # In a real application, you would send the user_input
             # to the cloud model API and print the response.
+
+            # Send the user input to the MCP server
+            await run_mcp_client(mcp, user_input)
         else:
-            # Local Model interaction using subprocess
-            local_model_command = config['local_model']['command']
+            # Local Model interaction using an asyncio subprocess; the MCP round
+            # trip runs while the answer streams, and its result is printed
+            # afterwards so the two outputs do not interleave
+            mcp_request = asyncio.ensure_future(request_mcp(mcp, user_input))
             try:
-                local_process = subprocess.Popen(
-                    local_model_command,
-                    shell=True,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-
-                # Send input to the local model
-                local_process.stdin.write(user_input + '\n')
-                local_process.stdin.flush()
-
-                # Capture the output
-                local_output = local_process.stdout.read()
-                print(f"Local Model Output: {local_output}")
-
-                local_process.stdin.close()
-                local_process.wait()
-
-            except Exception as e:
-                print(f"Error interacting with local model: {e}")
-
-        # Send the user input to the MCP server
-        await run_mcp_client(config, user_input)
+                if local_settings is None:
+                    try:
+                        local_settings = local_model_settings(config)
+                    except (KeyError, TypeError, ValueError) as e:
+                        print(f"Error interacting with local model: invalid local_model configuration ({e!r})")
+                if local_settings is not None:
+                    local_command, local_terminator = local_settings
+                    local_process = await ask_local_model(local_process, local_command, user_input, local_terminator)
+            finally:
+                print(await mcp_request)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    run_kwargs = {}
+    if uvloop is not None:
+        # uvloop.install() is deprecated since Python 3.12
+        if sys.version_info >= (3, 12):
+            run_kwargs["loop_factory"] = uvloop.new_event_loop
+        else:
+            uvloop.install()
+    asyncio.run(main(), **run_kwargs)
\ No newline at end of file